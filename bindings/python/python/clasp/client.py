@@ -6,23 +6,27 @@ Backward compatible: can decode MessagePack frames (legacy).
 """
 
 import asyncio
+import functools
+import re
 import struct
+import sys
 import time
-import fnmatch
-from typing import Any, Callable, Dict, List, Optional, Union, Tuple
+from typing import Any, Callable, Dict, List, Optional, Pattern, Set, Union, Tuple, cast
 from dataclasses import dataclass, field
 
-try:
-    import websockets
-    HAS_WEBSOCKETS = True
-except ImportError:
-    HAS_WEBSOCKETS = False
+import msgpack
+import websockets
+
+if sys.version_info >= (3, 11):
+    from asyncio import timeout as _timeout
+else:
+    from async_timeout import timeout as _timeout
 
 try:
-    import msgpack
-    HAS_MSGPACK = True
+    import msgspec
+    HAS_MSGSPEC = True
 except ImportError:
-    HAS_MSGPACK = False
+    HAS_MSGSPEC = False
 
 from .types import (
     Value,
@@ -33,6 +37,14 @@ from .types import (
     SubscriptionCallback,
 )
 
+# MessagePack codec for legacy frames and BUNDLE/QUERY fallback; msgspec
+# is used when installed
+_Packer = msgpack.Packer
+if HAS_MSGSPEC:
+    _unpack_msgpack = msgspec.msgpack.Decoder().decode
+else:
+    _unpack_msgpack = functools.partial(msgpack.unpackb, raw=False)
+
 
 # Message type codes (binary format)
 MSG_HELLO = 0x01
@@ -74,6 +86,66 @@ SIG_STREAM = 2
 SIG_GESTURE = 3
 SIG_TIMELINE = 4
 
+# Frame header: magic, flags, payload length
+_FRAME_HEADER = struct.Struct('>BBH')
+
+# Sentinel for cache misses (None is a valid cached value)
+_MISSING = object()
+
+# Frame payload length is a 16-bit field
+_MAX_PAYLOAD = 0xFFFF
+
+# Maximum addresses whose resolved subscriber lists are cached
+_SUB_CACHE_LIMIT = 4096
+
+# Maximum stream_nowait sends in flight at once
+_MAX_INFLIGHT = 1024
+
+# Python 3.12+ can run a new task's first step immediately
+_eager_task_factory = getattr(asyncio, "eager_task_factory", None)
+
+
+def _pattern_segments(pattern: str) -> List[str]:
+    """Split a pattern into segments, collapsing runs of '**'"""
+    parts: List[str] = []
+    for part in pattern.split('/'):
+        # Consecutive '**' segments are equivalent to a single one
+        if not (part == '**' and parts and parts[-1] == '**'):
+            parts.append(part)
+    return parts
+
+
+def _trie_node() -> Dict[str, Any]:
+    """Create an empty subscription trie node"""
+    return {"children": {}, "wild_single": None, "wild_multi": None, "callbacks": {}}
+
+
+def _compile_pattern(pattern: str) -> Pattern[str]:
+    """
+    Compile a CLASP address pattern to an anchored regex.
+
+    Segments are split on '/'. A '*' segment matches exactly one non-empty
+    segment, a '**' segment matches zero or more segments, and everything
+    else is matched literally.
+    """
+    parts = _pattern_segments(pattern)
+    regex = []
+    sep = ''
+    for i, part in enumerate(parts):
+        if part == '**':
+            if i == 0:
+                # Leading '**' consumes whole segments including their '/'
+                regex.append('.*' if len(parts) == 1 else '(?:[^/]*/)*')
+                sep = ''
+            else:
+                regex.append('(?:/[^/]*)*')
+                sep = '/'
+            continue
+        regex.append(sep)
+        regex.append('[^/]+' if part == '*' else re.escape(part))
+        sep = '/'
+    return re.compile('\\A' + ''.join(regex) + '\\Z')
+
 
 class ClaspError(Exception):
     """CLASP client error"""
@@ -89,6 +161,7 @@ class ClaspBuilder:
     token: Optional[str] = None
     reconnect: bool = True
     reconnect_interval: float = 5.0
+    batch: bool = False
 
     def with_name(self, name: str) -> "ClaspBuilder":
         """Set client name"""
@@ -111,6 +184,11 @@ class ClaspBuilder:
         self.reconnect_interval = interval
         return self
 
+    def with_batching(self, enabled: bool = True) -> "ClaspBuilder":
+        """Coalesce set/emit/stream calls into one BUNDLE per loop tick"""
+        self.batch = enabled
+        return self
+
     async def connect(self) -> "Clasp":
         """Build and connect"""
         client = Clasp(
@@ -120,6 +198,7 @@ class ClaspBuilder:
             token=self.token,
             reconnect=self.reconnect,
             reconnect_interval=self.reconnect_interval,
+            batch=self.batch,
         )
         await client.connect()
         return client
@@ -138,6 +217,10 @@ class Clasp:
         ...     print(f'{address} = {value}')
         >>>
         >>> await sf.set('/lumen/layer/0/opacity', 0.75)
+
+    With batch=True, set(), emit() and stream() queue their messages and a
+    background task sends everything queued during one event loop tick as
+    a single BUNDLE. Use flush() to wait until queued messages are sent.
     """
 
     def __init__(
@@ -148,35 +231,55 @@ class Clasp:
         token: Optional[str] = None,
         reconnect: bool = True,
         reconnect_interval: float = 5.0,
+        batch: bool = False,
     ):
-        if not HAS_WEBSOCKETS:
-            raise ImportError("websockets package required: pip install websockets")
-        if not HAS_MSGPACK:
-            raise ImportError("msgpack package required: pip install msgpack")
-
         self.url = url
         self.name = name
         self.features = features or ["param", "event", "stream"]
         self.token = token
         self.reconnect = reconnect
         self.reconnect_interval = reconnect_interval
+        self.batch = batch
 
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
         self._ws: Optional[websockets.WebSocketClientProtocol] = None
+        self._ws_send: Optional[Callable[[Union[bytes, bytearray]], Any]] = None
+        self._pack_msgpack: Callable[[Any], bytes] = (
+            msgspec.msgpack.Encoder().encode if HAS_MSGSPEC
+            else _Packer(use_bin_type=True, autoreset=True).pack
+        )
         self._session_id: Optional[str] = None
         self._connected = False
         self._params: Dict[str, Value] = {}
         self._subscriptions: Dict[int, tuple] = {}  # id -> (pattern, callback)
+        self._literal_subs: Dict[str, Dict[int, SubscriptionCallback]] = {}
+        self._sub_trie: Dict[str, Any] = _trie_node()
+        self._wildcard_subs = 0
+        self._sub_cache: Dict[str, Tuple[SubscriptionCallback, ...]] = {}
         self._next_sub_id = 1
         self._server_time_offset = 0
         self._pending_gets: Dict[str, asyncio.Future] = {}
         self._pending_queries: Dict[str, asyncio.Future] = {}
         self._receive_task: Optional[asyncio.Task] = None
+        self._send_queue: Optional[asyncio.Queue] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self._inflight: Set[asyncio.Task] = set()
 
         # Callbacks
         self._on_connect: List[Callable] = []
         self._on_disconnect: List[Callable] = []
         self._on_error: List[Callable] = []
 
+        # Inbound message handlers by type
+        self._dispatch: Dict[str, Callable[[Dict[str, Any]], None]] = {
+            "SET": self._handle_set,
+            "SNAPSHOT": self._handle_snapshot,
+            "PUBLISH": self._handle_publish,
+            "PING": self._handle_ping,
+            "RESULT": self._handle_result,
+            "ERROR": self._handle_error,
+        }
+
     @classmethod
     def builder(cls, url: str) -> ClaspBuilder:
         """Create a builder"""
@@ -194,7 +297,7 @@ class Clasp:
 
     def time(self) -> int:
         """Get current server time (microseconds)"""
-        return int(time.time() * 1_000_000) + self._server_time_offset
+        return time.time_ns() // 1000 + self._server_time_offset
 
     async def connect(self) -> None:
         """Connect to server"""
@@ -202,10 +305,12 @@ class Clasp:
             raise ClaspError("Already connected")
 
         try:
+            self._loop = asyncio.get_running_loop()
             self._ws = await websockets.connect(
                 self.url,
                 subprotocols=[WS_SUBPROTOCOL],
             )
+            self._ws_send = self._ws.send
 
             # Send HELLO
             await self._send({
@@ -223,25 +328,46 @@ class Clasp:
 
                 if msg.get("type") == "WELCOME":
                     self._session_id = msg["session"]
-                    self._server_time_offset = msg["time"] - int(time.time() * 1_000_000)
+                    self._server_time_offset = msg["time"] - time.time_ns() // 1000
                     self._connected = True
                     break
 
             # Start receive loop
-            self._receive_task = asyncio.create_task(self._receive_loop())
+            self._receive_task = self._loop.create_task(self._receive_loop())
+            if self.batch and self._flush_task is None:
+                self._start_flusher()
 
             # Notify callbacks
             for cb in self._on_connect:
                 cb()
 
         except Exception as e:
+            if not self._connected:
+                self._loop = None
+                self._ws_send = None
             raise ClaspError(f"Connection failed: {e}") from e
 
     async def close(self) -> None:
         """Close connection"""
+        if self._flush_task and self._connected:
+            await self.flush()
+
         self.reconnect = False
         self._connected = False
 
+        if self._flush_task:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+            self._send_queue = None
+
+        for task in self._inflight:
+            task.cancel()
+        self._inflight.clear()
+
         if self._receive_task:
             self._receive_task.cancel()
             try:
@@ -252,6 +378,9 @@ class Clasp:
         if self._ws:
             await self._ws.close()
             self._ws = None
+            self._ws_send = None
+
+        self._loop = None
 
     def subscribe(
         self,
@@ -274,22 +403,37 @@ class Clasp:
         self._next_sub_id += 1
 
         self._subscriptions[sub_id] = (pattern, callback)
+        self._sub_cache.clear()
+        if '*' in pattern:
+            self._trie_insert(pattern, sub_id, callback)
+            self._wildcard_subs += 1
+        else:
+            self._literal_subs.setdefault(pattern, {})[sub_id] = callback
 
         # Send subscribe message
-        asyncio.create_task(self._send({
+        self._send_soon({
             "type": "SUBSCRIBE",
             "id": sub_id,
             "pattern": pattern,
             "options": options if options else None,
-        }))
+        })
 
         def unsubscribe():
             if sub_id in self._subscriptions:
                 del self._subscriptions[sub_id]
-                asyncio.create_task(self._send({
+                self._sub_cache.clear()
+                if '*' in pattern:
+                    self._trie_remove(pattern, sub_id)
+                    self._wildcard_subs -= 1
+                else:
+                    subs = self._literal_subs[pattern]
+                    del subs[sub_id]
+                    if not subs:
+                        del self._literal_subs[pattern]
+                self._send_soon({
                     "type": "UNSUBSCRIBE",
                     "id": sub_id,
-                }))
+                })
 
         return unsubscribe
 
@@ -309,33 +453,68 @@ class Clasp:
 
     async def set(self, address: str, value: Value) -> None:
         """Set parameter value"""
-        await self._send({
+        await self._send_batched({
             "type": "SET",
             "address": address,
             "value": value,
         })
 
+    async def set_many(self, pairs: List[Tuple[str, Value]]) -> None:
+        """
+        Set several parameter values in one frame
+
+        Values that would not fit in one frame are split across several
+        BUNDLEs. Raises ClaspError if a single value is too large to send.
+
+        Example:
+            await sf.set_many([('/system/cpu', 0.5), ('/system/memory', 0.25)])
+        """
+        if not pairs:
+            return
+
+        messages = [
+            {"type": "SET", "address": address, "value": value}
+            for address, value in pairs
+        ]
+
+        # Keep ordering with set() calls already waiting in the batch queue
+        queue = self._send_queue
+        if queue is not None:
+            for msg in messages:
+                queue.put_nowait(msg)
+            return
+
+        await self._send_bundled(messages)
+
     async def get(self, address: str, timeout: float = 5.0) -> Value:
-        """Get current value"""
+        """
+        Get current value
+
+        Returns the cached value when there is one, otherwise requests it from
+        the server. For polling in tight loops use cached(), which is
+        synchronous and never creates a coroutine.
+        """
         # Check cache first
-        if address in self._params:
-            return self._params[address]
+        value = self._params.get(address, _MISSING)
+        if value is not _MISSING:
+            return cast(Value, value)
 
         # Request from server
-        future = asyncio.get_event_loop().create_future()
+        future: "asyncio.Future[Value]" = self._create_future()
         self._pending_gets[address] = future
 
         await self._send({"type": "GET", "address": address})
 
         try:
-            return await asyncio.wait_for(future, timeout=timeout)
+            async with _timeout(timeout):
+                return await future
         except asyncio.TimeoutError:
             del self._pending_gets[address]
             raise ClaspError("Get timeout")
 
     async def emit(self, address: str, payload: Value = None) -> None:
         """Emit event"""
-        await self._send({
+        await self._send_batched({
             "type": "PUBLISH",
             "address": address,
             "signal": "event",
@@ -345,7 +524,24 @@ class Clasp:
 
     async def stream(self, address: str, value: Value) -> None:
         """Send stream sample"""
-        await self._send({
+        await self._send_batched({
+            "type": "PUBLISH",
+            "address": address,
+            "signal": "stream",
+            "value": value,
+            "timestamp": self.time(),
+        })
+
+    def stream_nowait(self, address: str, value: Value) -> None:
+        """
+        Send stream sample without awaiting
+
+        For high-rate telemetry. The send is scheduled instead of awaited, so
+        the caller is not held back by websocket backpressure. Send errors
+        are reported to on_error callbacks. Raises ClaspError if too many
+        samples are still waiting to be sent.
+        """
+        self._send_nowait({
             "type": "PUBLISH",
             "address": address,
             "signal": "stream",
@@ -392,7 +588,7 @@ class Clasp:
         Returns:
             List of signal definitions with address, type, datatype, etc.
         """
-        future = asyncio.get_event_loop().create_future()
+        future: "asyncio.Future[List[Dict[str, Any]]]" = self._create_future()
         self._pending_queries[pattern] = future
 
         await self._send({
@@ -401,7 +597,8 @@ class Clasp:
         })
 
         try:
-            return await asyncio.wait_for(future, timeout=timeout)
+            async with _timeout(timeout):
+                return await future
         except asyncio.TimeoutError:
             if pattern in self._pending_queries:
                 del self._pending_queries[pattern]
@@ -468,8 +665,18 @@ class Clasp:
             "timestamp": start_time or self.time(),
         })
 
+    async def flush(self) -> None:
+        """Wait until all batched messages have been sent"""
+        if self._send_queue is not None:
+            await self._send_queue.join()
+
     def cached(self, address: str) -> Optional[Value]:
-        """Get cached value"""
+        """
+        Get cached value
+
+        Synchronous counterpart of get() for hot polling: returns the last
+        value seen for address, or None if none has been received.
+        """
         return self._params.get(address)
 
     def on_connect(self, callback: Callable[[], None]) -> None:
@@ -485,56 +692,181 @@ class Clasp:
         self._on_error.append(callback)
 
     def run(self) -> None:
-        """Run event loop (blocking)"""
-        asyncio.get_event_loop().run_forever()
+        """
+        Run event loop (blocking)
+
+        A connected client keeps the loop its connection is bound to. For
+        uvloop, run your entry point with uvloop.run() instead.
+        """
+        loop = self._loop
+        if loop is None or not self._connected:
+            loop = asyncio.get_event_loop()
+        loop.run_forever()
 
     # Private methods
 
     async def _send(self, msg: Dict[str, Any]) -> None:
         """Send message"""
-        if not self._ws:
+        send = self._ws_send
+        if send is None:
             raise ClaspError("Not connected")
 
-        data = self._encode(msg)
-        await self._ws.send(data)
+        await send(self._encode(msg))
 
-    def _encode(self, msg: Dict[str, Any]) -> bytes:
-        """Encode message to binary frame"""
-        payload = self._encode_message_v3(msg)
+    async def _send_batched(self, msg: Dict[str, Any]) -> None:
+        """Queue message for the flusher when batching, otherwise send it"""
+        queue = self._send_queue
+        if queue is None:
+            await self._send(msg)
+        else:
+            queue.put_nowait(msg)
 
-        # Build frame header with encoding version bit
-        flags = 0x01  # Encoding = 1 (binary), 0 = MessagePack (legacy)
-        header = bytes([
-            0x53,  # Magic
-            flags,
-            (len(payload) >> 8) & 0xFF,
-            len(payload) & 0xFF,
-        ])
+    def _send_nowait(self, msg: Dict[str, Any]) -> None:
+        """Queue or schedule message from synchronous code"""
+        queue = self._send_queue
+        if queue is not None:
+            queue.put_nowait(msg)
+            return
+
+        if self._ws_send is None:
+            raise ClaspError("Not connected")
+        if len(self._inflight) >= _MAX_INFLIGHT:
+            raise ClaspError(f"Too many sends in flight ({_MAX_INFLIGHT})")
+
+        # Hold a reference until done; the loop only keeps weak ones
+        task = self._send_soon(msg)
+        self._inflight.add(task)
+        task.add_done_callback(self._send_nowait_done)
+
+    def _send_nowait_done(self, task: "asyncio.Task[None]") -> None:
+        """Release a finished background send, passing its error to error callbacks"""
+        self._inflight.discard(task)
+        if task.cancelled():
+            return
+        e = task.exception()
+        if e is not None:
+            self._report_error(e)
+
+    def _start_flusher(self) -> None:
+        """Create the send queue and its flusher task"""
+        self._send_queue = asyncio.Queue()
+        loop = self._loop or asyncio.get_running_loop()
+        self._flush_task = loop.create_task(self._flush_loop(self._send_queue))
+
+    async def _flush_loop(self, queue: asyncio.Queue) -> None:
+        """Send queued messages, one BUNDLE per batch"""
+        while True:
+            batch = [await queue.get()]
+            while not queue.empty():
+                batch.append(queue.get_nowait())
+
+            try:
+                await self._send_bundled(batch, report=True)
+            except Exception as e:
+                self._report_error(e)
+            finally:
+                for _ in batch:
+                    queue.task_done()
+
+    async def _send_bundled(self, messages: List[Dict[str, Any]], report: bool = False) -> None:
+        """
+        Send messages as one BUNDLE, splitting it only if it cannot be encoded
+
+        A message that cannot be sent on its own raises, or with report=True
+        is passed to the on_error callbacks and dropped.
+        """
+        if len(messages) == 1:
+            try:
+                await self._send(messages[0])
+            except Exception as e:
+                if not report:
+                    raise
+                self._report_error(e)
+            return
+
+        send = self._ws_send
+        if send is None:
+            raise ClaspError("Not connected")
 
-        return header + payload
+        try:
+            frame = self._encode({
+                "type": "BUNDLE",
+                "timestamp": None,
+                "messages": messages,
+            })
+        except Exception:
+            # Too large for one frame, or holds a value that cannot be packed
+            mid = len(messages) // 2
+            await self._send_bundled(messages[:mid], report)
+            await self._send_bundled(messages[mid:], report)
+            return
+        await send(frame)
+
+    def _report_error(self, error: BaseException) -> None:
+        """Pass an error from a background send to the on_error callbacks"""
+        for cb in self._on_error:
+            cb(error)
+
+    def _create_future(self) -> asyncio.Future:
+        """Create a future on the connection's event loop"""
+        loop = self._loop
+        if self._ws_send is None or loop is None:
+            raise ClaspError("Not connected")
+        return loop.create_future()
+
+    def _send_soon(self, msg: Dict[str, Any]) -> "asyncio.Task[None]":
+        """
+        Send message in the background.
+
+        On Python 3.12+ the task starts eagerly, so a send that does not
+        need to wait completes before this returns, without a loop hop.
+        """
+        loop = self._loop
+        if self._ws_send is None or loop is None:
+            loop = asyncio.get_running_loop()
+        if _eager_task_factory is not None:
+            return cast("asyncio.Task[None]", _eager_task_factory(loop, self._send(msg)))
+        return loop.create_task(self._send(msg))
+
+    def _encode(self, msg: Dict[str, Any]) -> bytearray:
+        """Encode message to binary frame"""
+        try:
+            payload = self._encode_message_v3(msg)
+        except struct.error as e:
+            # Length prefixes in the wire format are 16 bits
+            raise ClaspError(f"Message too large to encode: {e}") from e
+        size = len(payload)
+        if size > _MAX_PAYLOAD:
+            raise ClaspError(f"Message too large for one frame ({size} bytes)")
+
+        # Header and payload are written into one buffer, which websockets
+        # sends as a binary frame without further conversion
+        flags = 0x01  # Encoding = 1 (binary), 0 = MessagePack (legacy)
+        frame = bytearray(4 + size)
+        _FRAME_HEADER.pack_into(frame, 0, 0x53, flags, size)
+        frame[4:] = payload
+        return frame
 
     def _decode(self, data: bytes) -> Dict[str, Any]:
         """Decode frame to message - auto-detects MessagePack vs binary encoding"""
-        if len(data) < 4 or data[0] != 0x53:
+        if len(data) < 4:
+            raise ClaspError("Invalid frame")
+        magic, flags, payload_len = _FRAME_HEADER.unpack_from(data, 0)
+        if magic != 0x53:
             raise ClaspError("Invalid frame")
 
-        flags = data[1]
-        payload_len = (data[2] << 8) | data[3]
-        has_timestamp = (flags & 0x20) != 0
-        version = flags & 0x07
-
-        offset = 12 if has_timestamp else 4
-        payload = data[offset:offset + payload_len]
+        offset = 12 if flags & 0x20 else 4
+        end = offset + payload_len
 
         # Check if v2 MessagePack (first byte is fixmap 0x80-0x8F or map)
-        if len(payload) > 0:
-            first = payload[0]
+        if offset < min(end, len(data)):
+            first = data[offset]
             if (first & 0xF0) == 0x80 or first in (0xDE, 0xDF):
-                # v2 MessagePack
-                return msgpack.unpackb(payload, raw=False)
+                # v2 MessagePack, unpacked straight from the frame buffer
+                return _unpack_msgpack(memoryview(data)[offset:end])
 
         # Binary encoding format
-        return self._decode_message_v3(payload)
+        return self._decode_message_v3(data[offset:end])
 
     def _encode_message_v3(self, msg: Dict[str, Any]) -> bytes:
         """Encode message to binary format"""
@@ -645,7 +977,7 @@ class Clasp:
 
         else:
             # Fall back to MessagePack for unsupported types
-            return msgpack.packb(msg)
+            return self._pack_msgpack(msg)
 
         return b''.join(parts)
 
@@ -962,12 +1294,9 @@ class Clasp:
         return {0: "start", 1: "move", 2: "end", 3: "cancel"}.get(code, "start")
 
     async def _receive_loop(self) -> None:
-        """Receive message loop"""
+        """Receive messages, reconnecting if the connection drops"""
         try:
-            while self._connected and self._ws:
-                data = await self._ws.recv()
-                msg = self._decode(data)
-                self._handle_message(msg)
+            await self._read_messages()
 
         except websockets.ConnectionClosed as e:
             self._connected = False
@@ -986,59 +1315,179 @@ class Clasp:
             for cb in self._on_error:
                 cb(e)
 
-    def _handle_message(self, msg: Dict[str, Any]) -> None:
-        """Handle incoming message"""
-        msg_type = msg.get("type")
-
-        if msg_type == "SET":
-            address = msg["address"]
-            value = msg["value"]
-            self._params[address] = value
-            self._notify_subscribers(address, value)
-
-        elif msg_type == "SNAPSHOT":
-            for param in msg.get("params", []):
-                address = param["address"]
-                value = param["value"]
-                self._params[address] = value
+    async def _read_messages(self) -> None:
+        """Decode and handle frames until the connection closes"""
+        ws = self._ws
+        if ws is None:
+            raise ClaspError("Not connected")
 
-                # Resolve pending gets
-                if address in self._pending_gets:
-                    self._pending_gets[address].set_result(value)
-                    del self._pending_gets[address]
+        # Bound once so the per-frame loop only touches locals
+        ws_recv = ws.recv
+        decode = self._decode
+        handle = self._handle_message
+        while True:
+            handle(decode(await ws_recv()))
 
-                self._notify_subscribers(address, value)
+    def _handle_message(self, msg: Dict[str, Any]) -> None:
+        """Handle incoming message"""
+        handler = self._dispatch.get(msg.get("type", ""))
+        if handler is not None:
+            handler(msg)
+
+    def _handle_set(self, msg: Dict[str, Any]) -> None:
+        """Handle SET: update cache and notify"""
+        address = msg["address"]
+        value = msg["value"]
+        self._params[address] = value
+        self._notify_subscribers(address, value)
+
+    def _handle_snapshot(self, msg: Dict[str, Any]) -> None:
+        """Handle SNAPSHOT: update cache, resolve gets and notify"""
+        params = self._params
+        pending = self._pending_gets
+        for param in msg.get("params", []):
+            address = param["address"]
+            value = param["value"]
+            params[address] = value
+
+            # Resolve pending gets
+            if address in pending:
+                pending.pop(address).set_result(value)
 
-        elif msg_type == "PUBLISH":
-            address = msg["address"]
-            value = msg.get("value") or msg.get("payload")
             self._notify_subscribers(address, value)
 
-        elif msg_type == "PING":
-            asyncio.create_task(self._send({"type": "PONG"}))
-
-        elif msg_type == "RESULT":
-            # Handle signal query results
-            signals = msg.get("signals", [])
-            # Try to match with pending queries
-            for pattern, future in list(self._pending_queries.items()):
-                if not future.done():
-                    future.set_result(signals)
-                    del self._pending_queries[pattern]
-                    break
+    def _handle_publish(self, msg: Dict[str, Any]) -> None:
+        """Handle PUBLISH: notify"""
+        get = msg.get
+        self._notify_subscribers(msg["address"], get("value") or get("payload"))
+
+    def _handle_ping(self, msg: Dict[str, Any]) -> None:
+        """Handle PING: reply with PONG"""
+        self._send_soon({"type": "PONG"})
+
+    def _handle_result(self, msg: Dict[str, Any]) -> None:
+        """Handle signal query results"""
+        signals = msg.get("signals", [])
+        # Try to match with pending queries
+        for pattern, future in list(self._pending_queries.items()):
+            if not future.done():
+                future.set_result(signals)
+                del self._pending_queries[pattern]
+                break
 
-        elif msg_type == "ERROR":
-            print(f"CLASP error: {msg.get('code')} - {msg.get('message')}")
+    def _handle_error(self, msg: Dict[str, Any]) -> None:
+        """Handle ERROR"""
+        print(f"CLASP error: {msg.get('code')} - {msg.get('message')}")
 
     def _notify_subscribers(self, address: str, value: Value) -> None:
         """Notify matching subscribers"""
-        for pattern, callback in self._subscriptions.values():
-            if self._match_pattern(pattern, address):
-                try:
-                    callback(value, address)
-                except Exception as e:
-                    for cb in self._on_error:
-                        cb(e)
+        callbacks = self._sub_cache.get(address)
+        if callbacks is None:
+            callbacks = self._resolve_subscribers(address)
+            cache = self._sub_cache
+            if len(cache) >= _SUB_CACHE_LIMIT:
+                cache.clear()
+            cache[address] = callbacks
+        if not callbacks:
+            return
+
+        # One try block for the whole batch; on error, report and resume
+        # with the next callback
+        on_error = self._on_error
+        i = 0
+        n = len(callbacks)
+        while i < n:
+            try:
+                while i < n:
+                    callbacks[i](value, address)
+                    i += 1
+            except Exception as e:
+                i += 1
+                for cb in on_error:
+                    cb(e)
+
+    def _resolve_subscribers(self, address: str) -> Tuple[SubscriptionCallback, ...]:
+        """Find callbacks subscribed to address, in subscription order"""
+        # Exact-address subscriptions are a single dict lookup
+        literal = self._literal_subs.get(address)
+
+        if self._wildcard_subs:
+            matches: Dict[int, SubscriptionCallback] = dict(literal) if literal else {}
+            self._trie_collect(self._sub_trie, address.split('/'), 0, matches)
+            # Keep subscription order regardless of which branch matched
+            return tuple(matches[sub_id] for sub_id in sorted(matches))
+        if literal:
+            return tuple(literal.values())
+        return ()
+
+    def _trie_insert(self, pattern: str, sub_id: int, callback: SubscriptionCallback) -> None:
+        """Add subscription to the pattern trie"""
+        node = self._sub_trie
+        for part in _pattern_segments(pattern):
+            if part == '**':
+                if node["wild_multi"] is None:
+                    node["wild_multi"] = _trie_node()
+                node = node["wild_multi"]
+            elif part == '*':
+                if node["wild_single"] is None:
+                    node["wild_single"] = _trie_node()
+                node = node["wild_single"]
+            else:
+                node = node["children"].setdefault(part, _trie_node())
+        node["callbacks"][sub_id] = callback
+
+    def _trie_remove(self, pattern: str, sub_id: int) -> None:
+        """Remove subscription from the pattern trie, pruning empty branches"""
+        path = []
+        node = self._sub_trie
+        for part in _pattern_segments(pattern):
+            if part == '**':
+                child = node["wild_multi"]
+            elif part == '*':
+                child = node["wild_single"]
+            else:
+                child = node["children"].get(part)
+            if child is None:
+                return
+            path.append((node, part))
+            node = child
+
+        node["callbacks"].pop(sub_id, None)
+
+        for parent, part in reversed(path):
+            if node["callbacks"] or node["children"] or node["wild_single"] or node["wild_multi"]:
+                break
+            if part == '**':
+                parent["wild_multi"] = None
+            elif part == '*':
+                parent["wild_single"] = None
+            else:
+                del parent["children"][part]
+            node = parent
+
+    def _trie_collect(
+        self,
+        node: Dict[str, Any],
+        parts: List[str],
+        i: int,
+        matches: Dict[int, SubscriptionCallback],
+    ) -> None:
+        """Collect callbacks of every trie branch matching parts[i:]"""
+        if i == len(parts):
+            matches.update(node["callbacks"])
+        else:
+            child = node["children"].get(parts[i])
+            if child is not None:
+                self._trie_collect(child, parts, i + 1, matches)
+            # * matches exactly one non-empty segment
+            if parts[i] and node["wild_single"] is not None:
+                self._trie_collect(node["wild_single"], parts, i + 1, matches)
+
+        # ** matches zero or more segments
+        multi = node["wild_multi"]
+        if multi is not None:
+            for j in range(i, len(parts) + 1):
+                self._trie_collect(multi, parts, j, matches)
 
     def _match_pattern(self, pattern: str, address: str) -> bool:
         """
@@ -1053,56 +1502,4 @@ class Clasp:
           /test/* matches /test/foo but not /test/foo/bar
           /test/** matches /test, /test/foo, /test/foo/bar
         """
-        # Exact match
-        if pattern == address:
-            return True
-
-        # Split into segments
-        pattern_parts = pattern.split('/')
-        address_parts = address.split('/')
-
-        return self._match_segments(pattern_parts, address_parts)
-
-    def _match_segments(self, pattern_parts: List[str], address_parts: List[str]) -> bool:
-        """Recursively match pattern segments against address segments."""
-        pi = 0  # pattern index
-        ai = 0  # address index
-
-        while pi < len(pattern_parts):
-            p = pattern_parts[pi]
-
-            if p == '**':
-                # ** can match zero or more segments
-                # Try matching 0, 1, 2, ... segments
-                remaining_pattern = pattern_parts[pi + 1:]
-
-                if not remaining_pattern:
-                    # ** at end matches everything remaining
-                    return True
-
-                # Try matching from current position onwards
-                for skip in range(len(address_parts) - ai + 1):
-                    if self._match_segments(remaining_pattern, address_parts[ai + skip:]):
-                        return True
-                return False
-
-            elif p == '*':
-                # * matches exactly one non-empty segment
-                if ai >= len(address_parts):
-                    return False
-                if not address_parts[ai]:  # Empty segment
-                    return False
-                pi += 1
-                ai += 1
-
-            else:
-                # Exact segment match
-                if ai >= len(address_parts):
-                    return False
-                if p != address_parts[ai]:
-                    return False
-                pi += 1
-                ai += 1
-
-        # Pattern consumed, check if address is also consumed
-        return ai == len(address_parts)
+        return _compile_pattern(pattern).match(address) is not None
@@ -1,8 +1,40 @@
 """Tests for CLASP client."""
 
+import asyncio
+
 import pytest
+import websockets
 from clasp import Clasp, ClaspBuilder
-from clasp.client import ClaspError
+from clasp.client import ClaspError, MSG_SUBSCRIBE, MSG_UNSUBSCRIBE, _MAX_INFLIGHT
+
+
+class FakeWebSocket:
+    """Minimal websocket stand-in that records sent frames."""
+
+    def __init__(self, incoming=()):
+        self.sent = []
+        self.incoming = list(incoming)
+
+    async def recv(self):
+        await asyncio.sleep(0)
+        if not self.incoming:
+            raise websockets.ConnectionClosed(None, None)
+        return self.incoming.pop(0)
+
+    async def send(self, data):
+        self.sent.append(data)
+
+    async def close(self):
+        pass
+
+
+def attach_fake_ws(client):
+    """Wire a FakeWebSocket into client as if connected (needs a running loop)."""
+    ws = FakeWebSocket()
+    client._loop = asyncio.get_running_loop()
+    client._ws = ws
+    client._ws_send = ws.send
+    return ws
 
 
 class TestClaspBuilder:
@@ -93,36 +125,519 @@ class TestClasp:
         assert t > 0
 
 
+def _regex_match(pattern, address):
+    """Match through _match_pattern."""
+    return Clasp("ws://localhost:7330")._match_pattern(pattern, address)
+
+
+def _dispatch_match(pattern, address):
+    """Match through subscribe() and subscriber dispatch."""
+    client = Clasp("ws://localhost:7330")
+    received = []
+
+    async def run():
+        attach_fake_ws(client)
+        client.subscribe(pattern, lambda v, a: received.append(a))
+        client._notify_subscribers(address, None)
+
+    asyncio.run(run())
+    return received == [address]
+
+
 class TestPatternMatching:
     """Test address pattern matching."""
 
-    def test_exact_match(self):
+    @pytest.fixture(params=[_regex_match, _dispatch_match], ids=["regex", "dispatch"])
+    def match(self, request):
+        return request.param
+
+    def test_exact_match(self, match):
+        assert match("/test/path", "/test/path") is True
+        assert match("/test/path", "/other/path") is False
+
+    def test_single_wildcard(self, match):
+        pattern = "/test/*/value"
+        assert match(pattern, "/test/foo/value") is True
+        assert match(pattern, "/test/bar/value") is True
+        assert match(pattern, "/test/value") is False
+        assert match(pattern, "/test/foo/bar/value") is False
+        assert match(pattern, "/test//value") is False
+
+    def test_multi_wildcard(self, match):
+        pattern = "/test/**/value"
+        assert match(pattern, "/test/value") is True
+        assert match(pattern, "/test/foo/value") is True
+        assert match(pattern, "/test/foo/bar/value") is True
+        assert match(pattern, "/test/foo/bar") is False
+
+    def test_trailing_wildcard(self, match):
+        pattern = "/test/**"
+        assert match(pattern, "/test") is True
+        assert match(pattern, "/test/foo") is True
+        assert match(pattern, "/test/foo/bar") is True
+        assert match(pattern, "/other/test") is False
+        assert match(pattern, "/testing") is False
+
+    def test_leading_and_repeated_wildcards(self, match):
+        assert match("**", "/any/path") is True
+        assert match("**/value", "/a/b/value") is True
+        assert match("**/value", "/a/b/other") is False
+        assert match("/a/**/**/b", "/a/b") is True
+        assert match("/a/**/**/b", "/a/x/y/b") is True
+
+    def test_literal_metacharacters(self, match):
+        pattern = "/test/a.b/value+"
+        assert match(pattern, "/test/a.b/value+") is True
+        assert match(pattern, "/test/axb/value+") is False
+        assert match(pattern, "/test/a.b/valuee") is False
+
+
+class TestSubscriptionDispatch:
+    """Test dispatch of inbound values to subscribers."""
+
+    @pytest.mark.asyncio
+    async def test_dispatch_in_subscription_order(self):
         client = Clasp("ws://localhost:7330")
-        assert client._match_pattern("/test/path", "/test/path") is True
-        assert client._match_pattern("/test/path", "/other/path") is False
+        attach_fake_ws(client)
+        received = []
+        client.subscribe("/lumen/**", lambda v, a: received.append("multi"))
+        client.subscribe("/lumen/layer/*/opacity", lambda v, a: received.append("single"))
+        client.subscribe("/lumen/layer/0/opacity", lambda v, a: received.append("exact"))
+        client.subscribe("/other/**", lambda v, a: received.append("other"))
 
-    def test_single_wildcard(self):
+        client._notify_subscribers("/lumen/layer/0/opacity", 0.5)
+        assert received == ["multi", "single", "exact"]
+
+    @pytest.mark.asyncio
+    async def test_subscribe_sends_subscribe_and_unsubscribe(self):
         client = Clasp("ws://localhost:7330")
-        pattern = "/test/*/value"
-        assert client._match_pattern(pattern, "/test/foo/value") is True
-        assert client._match_pattern(pattern, "/test/bar/value") is True
-        assert client._match_pattern(pattern, "/test/value") is False
-        assert client._match_pattern(pattern, "/test/foo/bar/value") is False
+        ws = attach_fake_ws(client)
+        unsub = client.subscribe("/a/*", lambda v, a: None)
+        await asyncio.sleep(0)
+        unsub()
+        await asyncio.sleep(0)
+        assert len(ws.sent) == 2
+        assert ws.sent[0][4] == MSG_SUBSCRIBE
+        assert ws.sent[1][4] == MSG_UNSUBSCRIBE
 
-    def test_multi_wildcard(self):
+    @pytest.mark.asyncio
+    async def test_literal_subscription_bypasses_trie(self):
         client = Clasp("ws://localhost:7330")
-        pattern = "/test/**/value"
-        assert client._match_pattern(pattern, "/test/value") is True
-        assert client._match_pattern(pattern, "/test/foo/value") is True
-        assert client._match_pattern(pattern, "/test/foo/bar/value") is True
+        attach_fake_ws(client)
+        received = []
+        unsub = client.subscribe("/system/cpu", lambda v, a: received.append(v))
+        assert client._sub_trie["children"] == {}
 
-    def test_trailing_wildcard(self):
+        client._notify_subscribers("/system/cpu", 0.5)
+        client._notify_subscribers("/system/memory", 0.25)
+        assert received == [0.5]
+
+        unsub()
+        assert client._literal_subs == {}
+
+    @pytest.mark.asyncio
+    async def test_callback_error_reported_and_dispatch_continues(self):
         client = Clasp("ws://localhost:7330")
-        pattern = "/test/**"
-        assert client._match_pattern(pattern, "/test") is True
-        assert client._match_pattern(pattern, "/test/foo") is True
-        assert client._match_pattern(pattern, "/test/foo/bar") is True
-        assert client._match_pattern(pattern, "/other/test") is False
+        attach_fake_ws(client)
+        received = []
+        errors = []
+        client.on_error(errors.append)
+
+        def failing(value, address):
+            raise ValueError("boom")
+
+        client.subscribe("/a", failing)
+        client.subscribe("/a", lambda v, a: received.append(v))
+        client.subscribe("/*", failing)
+
+        client._notify_subscribers("/a", 1)
+        assert received == [1]
+        assert [str(e) for e in errors] == ["boom", "boom"]
+
+    @pytest.mark.asyncio
+    async def test_new_subscription_invalidates_cache(self):
+        client = Clasp("ws://localhost:7330")
+        attach_fake_ws(client)
+        received = []
+        client._notify_subscribers("/a/b", 1)
+        client.subscribe("/a/*", lambda v, a: received.append(v))
+        client._notify_subscribers("/a/b", 2)
+        assert received == [2]
+
+    @pytest.mark.asyncio
+    async def test_unsubscribe_prunes_trie(self):
+        client = Clasp("ws://localhost:7330")
+        attach_fake_ws(client)
+        received = []
+        unsub_a = client.subscribe("/a/*/b", lambda v, a: received.append(a))
+        unsub_b = client.subscribe("/a/**", lambda v, a: received.append(a))
+
+        unsub_a()
+        client._notify_subscribers("/a/x/b", 1)
+        assert received == ["/a/x/b"]
+
+        unsub_b()
+        client._notify_subscribers("/a/x/b", 1)
+        assert received == ["/a/x/b"]
+        assert client._sub_trie["children"] == {}
+
+
+class TestHandleMessage:
+    """Test inbound message handling."""
+
+    def test_set_updates_cache(self):
+        client = Clasp("ws://localhost:7330")
+        client._handle_message({"type": "SET", "address": "/a", "value": 2})
+        assert client.cached("/a") == 2
+
+    def test_snapshot_resolves_pending_get(self):
+        client = Clasp("ws://localhost:7330")
+        loop = asyncio.new_event_loop()
+        try:
+            future = loop.create_future()
+            client._pending_gets["/a"] = future
+            client._handle_message({
+                "type": "SNAPSHOT",
+                "params": [{"address": "/a", "value": 1.5}],
+            })
+            assert future.result() == 1.5
+            assert client._pending_gets == {}
+            assert client.cached("/a") == 1.5
+        finally:
+            loop.close()
+
+    def test_unknown_type_ignored(self):
+        client = Clasp("ws://localhost:7330")
+        client._handle_message({"type": "ANNOUNCE"})
+        client._handle_message({})
+
+
+class TestReceiveLoop:
+    """Test the receive loop."""
+
+    @pytest.mark.asyncio
+    async def test_frames_dispatched_until_close(self):
+        client = Clasp("ws://localhost:7330", reconnect=False)
+        ws = attach_fake_ws(client)
+        ws.incoming = [
+            client._encode({"type": "SET", "address": "/a", "value": i})
+            for i in range(3)
+        ]
+        client._connected = True
+        received = []
+        disconnects = []
+        client.subscribe("/a", lambda v, a: received.append(v))
+        client.on_disconnect(disconnects.append)
+
+        await client._receive_loop()
+        assert received == [0, 1, 2]
+        assert len(disconnects) == 1
+        assert client.connected is False
+
+
+class TestCloseAndReuse:
+    """Test reusing a client after close() in a new event loop."""
+
+    def test_reuse_after_close(self):
+        client = Clasp("ws://localhost:7330")
+
+        async def first_run():
+            attach_fake_ws(client)
+            client._connected = True
+            await client.close()
+
+        async def second_run():
+            unsub = client.subscribe("/a", lambda v, a: None)
+            assert callable(unsub)
+            with pytest.raises(ClaspError, match="Not connected"):
+                await client.get("/b")
+            await asyncio.sleep(0)
+
+        asyncio.run(first_run())
+        assert client._loop is None
+        asyncio.run(second_run())
+        assert client._pending_gets == {}
+
+    @pytest.mark.asyncio
+    async def test_failed_connect_clears_loop(self):
+        client = Clasp("ws://127.0.0.1:1", reconnect=False)
+        with pytest.raises(ClaspError, match="Connection failed"):
+            await client.connect()
+        assert client._loop is None
+        with pytest.raises(ClaspError, match="Not connected"):
+            await client.get("/a")
+        assert client._pending_gets == {}
+
+
+class TestGet:
+    """Test get method."""
+
+    @pytest.mark.asyncio
+    async def test_get_cached_without_server(self):
+        client = Clasp("ws://localhost:7330")
+        client._params["/a"] = None
+        client._params["/b"] = 0.5
+        assert await client.get("/a") is None
+        assert await client.get("/b") == 0.5
+
+    @pytest.mark.asyncio
+    async def test_get_not_connected_raises(self):
+        client = Clasp("ws://localhost:7330")
+        with pytest.raises(ClaspError, match="Not connected"):
+            await client.get("/a")
+        assert client._pending_gets == {}
+
+    @pytest.mark.asyncio
+    async def test_get_timeout(self):
+        client = Clasp("ws://localhost:7330")
+        attach_fake_ws(client)
+        with pytest.raises(ClaspError, match="Get timeout"):
+            await client.get("/a", timeout=0.01)
+        assert client._pending_gets == {}
+
+    @pytest.mark.asyncio
+    async def test_get_resolved_by_snapshot(self):
+        client = Clasp("ws://localhost:7330")
+        attach_fake_ws(client)
+        task = asyncio.ensure_future(client.get("/a", timeout=1.0))
+        await asyncio.sleep(0)
+        client._handle_message({
+            "type": "SNAPSHOT",
+            "params": [{"address": "/a", "value": 3}],
+        })
+        assert await task == 3
+
+
+class TestStreamNowait:
+    """Test fire-and-forget stream samples."""
+
+    @pytest.mark.asyncio
+    async def test_stream_nowait(self):
+        client = Clasp("ws://localhost:7330")
+        ws = attach_fake_ws(client)
+        client.stream_nowait("/sensors/temperature", 21.5)
+        await asyncio.sleep(0)
+        msg = client._decode(ws.sent[0])
+        assert msg["signal"] == "stream"
+        assert msg["value"] == 21.5
+
+    @pytest.mark.asyncio
+    async def test_stream_nowait_reports_send_error(self):
+        client = Clasp("ws://localhost:7330")
+        errors = []
+        client.on_error(errors.append)
+
+        async def failing_send(data):
+            raise OSError("broken pipe")
+
+        client._ws_send = failing_send
+        client.stream_nowait("/sensors/temperature", 21.5)
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        assert [str(e) for e in errors] == ["broken pipe"]
+
+    def test_stream_nowait_not_connected_raises(self):
+        client = Clasp("ws://localhost:7330")
+        with pytest.raises(ClaspError, match="Not connected"):
+            client.stream_nowait("/sensors/temperature", 21.5)
+
+    @pytest.mark.asyncio
+    async def test_stream_nowait_queued_when_batching(self):
+        client = Clasp("ws://localhost:7330", batch=True)
+        client._start_flusher()
+        client.stream_nowait("/sensors/temperature", 21.5)
+        await client.stream("/sensors/humidity", 0.4)
+        assert client._send_queue.qsize() == 2
+        await client.close()
+
+    @pytest.mark.asyncio
+    async def test_stream_nowait_holds_inflight_sends(self):
+        client = Clasp("ws://localhost:7330")
+        attach_fake_ws(client)
+        release = asyncio.Event()
+
+        async def blocked_send(data):
+            await release.wait()
+
+        client._ws_send = blocked_send
+        client.stream_nowait("/sensors/temperature", 21.5)
+        assert len(client._inflight) == 1
+
+        release.set()
+        for _ in range(3):
+            await asyncio.sleep(0)
+        assert not client._inflight
+
+    @pytest.mark.asyncio
+    async def test_stream_nowait_caps_inflight_sends(self):
+        client = Clasp("ws://localhost:7330")
+        attach_fake_ws(client)
+        release = asyncio.Event()
+
+        async def blocked_send(data):
+            await release.wait()
+
+        client._ws_send = blocked_send
+        for _ in range(_MAX_INFLIGHT):
+            client.stream_nowait("/sensors/temperature", 21.5)
+        with pytest.raises(ClaspError, match="in flight"):
+            client.stream_nowait("/sensors/temperature", 21.5)
+
+        release.set()
+        await client.close()
+        assert not client._inflight
+
+
+class TestBatching:
+    """Test coalescing of outbound messages into bundles."""
+
+    def test_builder_with_batching(self):
+        builder = ClaspBuilder(url="ws://localhost:7330")
+        assert builder.batch is False
+        assert builder.with_batching() is builder
+        assert builder.batch is True
+
+    @pytest.mark.asyncio
+    async def test_same_tick_messages_bundled(self):
+        client = Clasp("ws://localhost:7330", batch=True)
+        ws = attach_fake_ws(client)
+        client._start_flusher()
+
+        await client.set("/system/cpu", 0.5)
+        await client.set("/system/memory", 0.25)
+        await client.stream("/sensors/temperature", 21.5)
+        assert ws.sent == []
+
+        await client.flush()
+        assert len(ws.sent) == 1
+        msg = client._decode(ws.sent[0])
+        assert msg["type"] == "BUNDLE"
+        assert [m["address"] for m in msg["messages"]] == [
+            "/system/cpu",
+            "/system/memory",
+            "/sensors/temperature",
+        ]
+        await client.close()
+
+    @pytest.mark.asyncio
+    async def test_large_batch_split_under_frame_limit(self):
+        client = Clasp("ws://localhost:7330", batch=True)
+        ws = attach_fake_ws(client)
+        client._start_flusher()
+        errors = []
+        client.on_error(errors.append)
+
+        for i in range(100):
+            await client.set(f"/big/{i}", "x" * 1000)
+        await client.flush()
+
+        assert errors == []
+        assert len(ws.sent) > 1
+        addresses = []
+        for frame in ws.sent:
+            assert len(frame) - 4 <= 0xFFFF
+            msg = client._decode(frame)
+            if msg["type"] == "BUNDLE":
+                addresses.extend(m["address"] for m in msg["messages"])
+            else:
+                addresses.append(msg["address"])
+        assert addresses == [f"/big/{i}" for i in range(100)]
+        await client.close()
+
+    @pytest.mark.asyncio
+    async def test_oversized_message_reported(self):
+        client = Clasp("ws://localhost:7330", batch=True)
+        ws = attach_fake_ws(client)
+        client._start_flusher()
+        errors = []
+        client.on_error(errors.append)
+
+        await client.set("/huge", "x" * 70000)
+        await client.set("/small", 1)
+        await client.flush()
+
+        assert len(errors) == 1
+        assert isinstance(errors[0], ClaspError)
+        assert client._decode(ws.sent[0])["address"] == "/small"
+        await client.close()
+
+    @pytest.mark.asyncio
+    async def test_unpackable_value_reported(self):
+        client = Clasp("ws://localhost:7330", batch=True)
+        ws = attach_fake_ws(client)
+        client._start_flusher()
+        errors = []
+        client.on_error(errors.append)
+
+        await client.set("/a", 2 ** 70)
+        await client.set("/b", 1)
+        await asyncio.wait_for(client.flush(), 1.0)
+
+        assert len(errors) == 1
+        assert client._decode(ws.sent[0])["address"] == "/b"
+
+        # The flusher is still running
+        await client.set("/c", 2)
+        await asyncio.wait_for(client.flush(), 1.0)
+        assert client._decode(ws.sent[1])["address"] == "/c"
+        await client.close()
+
+    @pytest.mark.asyncio
+    async def test_single_message_not_bundled(self):
+        client = Clasp("ws://localhost:7330", batch=True)
+        ws = attach_fake_ws(client)
+        client._start_flusher()
+
+        await client.set("/system/uptime", 3)
+        await client.flush()
+        assert client._decode(ws.sent[0])["type"] == "SET"
+        await client.close()
+
+    @pytest.mark.asyncio
+    async def test_set_many_single_frame(self):
+        client = Clasp("ws://localhost:7330")
+        ws = attach_fake_ws(client)
+        await client.set_many([("/system/cpu", 0.5), ("/system/uptime", 3)])
+        await client.set_many([])
+        assert len(ws.sent) == 1
+        msg = client._decode(ws.sent[0])
+        assert msg["type"] == "BUNDLE"
+        assert msg["messages"] == [
+            {"type": "SET", "address": "/system/cpu", "value": 0.5},
+            {"type": "SET", "address": "/system/uptime", "value": 3},
+        ]
+
+    @pytest.mark.asyncio
+    async def test_set_many_splits_large_payloads(self):
+        client = Clasp("ws://localhost:7330")
+        ws = attach_fake_ws(client)
+        pairs = [(f"/big/{i}", "x" * 1000) for i in range(100)]
+        await client.set_many(pairs)
+
+        assert len(ws.sent) > 1
+        addresses = []
+        for frame in ws.sent:
+            assert len(frame) - 4 <= 0xFFFF
+            msg = client._decode(frame)
+            if msg["type"] == "BUNDLE":
+                addresses.extend(m["address"] for m in msg["messages"])
+            else:
+                addresses.append(msg["address"])
+        assert addresses == [address for address, _ in pairs]
+
+    @pytest.mark.asyncio
+    async def test_set_many_oversized_value_raises(self):
+        client = Clasp("ws://localhost:7330")
+        attach_fake_ws(client)
+        with pytest.raises(ClaspError, match="too large"):
+            await client.set_many([("/huge", "x" * 70000)])
+
+    @pytest.mark.asyncio
+    async def test_unbatched_set_sends_immediately(self):
+        client = Clasp("ws://localhost:7330")
+        ws = attach_fake_ws(client)
+        await client.set("/system/uptime", 3)
+        assert len(ws.sent) == 1
 
 
 class TestClaspError:
@@ -283,6 +798,36 @@ class TestMessageEncoding:
         from clasp.client import MSG_QUERY
         assert MSG_QUERY == 0x60
 
+    def test_frame_header(self):
+        """Frames carry magic, flags and big-endian payload length."""
+        client = Clasp("ws://localhost:7330")
+        frame = client._encode({"type": "SET", "address": "/a/b", "value": 1.5})
+        assert frame[0] == 0x53
+        assert frame[1] == 0x01
+        assert (frame[2] << 8) | frame[3] == len(frame) - 4
+        assert client._decode(bytes(frame))["value"] == 1.5
+
+    def test_decode_rejects_invalid_frames(self):
+        client = Clasp("ws://localhost:7330")
+        with pytest.raises(ClaspError, match="Invalid frame"):
+            client._decode(b"\x53\x01")
+        with pytest.raises(ClaspError, match="Invalid frame"):
+            client._decode(b"\x00\x01\x00\x01\x41")
+
+    @pytest.mark.asyncio
+    async def test_bundle_roundtrip(self):
+        """BUNDLE falls back to MessagePack and decodes back."""
+        client = Clasp("ws://localhost:7330")
+        ws = attach_fake_ws(client)
+        await client.bundle([{"set": ("/a", 1)}, {"emit": ("/b", b"x")}])
+        await client.bundle([{"set": ("/c", 2.5)}])
+
+        first = client._decode(ws.sent[0])
+        assert first["type"] == "BUNDLE"
+        assert first["messages"][0] == {"type": "SET", "address": "/a", "value": 1}
+        assert first["messages"][1]["payload"] == b"x"
+        assert client._decode(ws.sent[1])["messages"][0]["value"] == 2.5
+
     def test_result_message_code(self):
         """Test that RESULT message code is defined."""
         from clasp.client import MSG_RESULT
@@ -25,6 +25,9 @@ Usage:
     
     # Then run this script
     python examples/python/embedded_server.py
+
+    # Optional: install uvloop for a faster event loop (Linux/macOS)
+    pip install clasp-to[fast]
 """
 
 import asyncio
@@ -32,6 +35,11 @@ import random
 import time
 from clasp import Clasp
 
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
 async def main():
     print('╔══════════════════════════════════════════════════════════╗')
     print('║      Python Application with CLASP Integration           ║')
@@ -65,10 +73,13 @@ async def main():
             temperature = random.uniform(20, 35)  # 20-35°C
             uptime = int(time.time() - start_time)
 
-            await client.set('/system/cpu', cpu_usage)
-            await client.set('/system/memory', memory_usage)
-            await client.set('/sensors/temperature', temperature)
-            await client.set('/system/uptime', uptime)
+            # One frame for all four values
+            await client.set_many([
+                ('/system/cpu', cpu_usage),
+                ('/system/memory', memory_usage),
+                ('/sensors/temperature', temperature),
+                ('/system/uptime', uptime),
+            ])
 
             print(
                 f'Published: cpu={cpu_usage * 100:.1f}%, '
@@ -85,4 +96,7 @@ async def main():
         await client.close()
 
 if __name__ == '__main__':
-    asyncio.run(main())
+    if uvloop is not None:
+        uvloop.run(main())
+    else:
+        asyncio.run(main())
@@ -17,6 +17,8 @@ import sys
 import os
 import re
 import json
+import mmap
+import stat
 from pathlib import Path
 
 # Baseline file location
@@ -29,34 +31,39 @@ THRESHOLDS = {
     "memory_per_conn": 20.0,  # Alert if memory per connection increases >20%
 }
 
+# All metrics in one alternation so the output is scanned once
+METRICS_RE = re.compile(
+    rb'P50:\s*(?P<p50_latency>\d+)'                            # P50 latency (µs)
+    rb'|P95:\s*(?P<p95_latency>\d+)'                           # P95 latency (µs)
+    rb'|P99:\s*(?P<p99_latency>\d+)'                           # P99 latency (µs)
+    rb'|Throughput:\s*(?P<throughput>[\d.]+)\s*msg/s'          # Throughput (msg/s)
+)
+
 
 def parse_benchmark_results(filepath: str) -> dict:
     """Parse benchmark output to extract key metrics."""
+    with open(filepath, 'rb') as f:
+        st = os.fstat(f.fileno())
+        # Pipes and process substitution can't be mapped; read them instead
+        if stat.S_ISREG(st.st_mode) and st.st_size > 0:
+            try:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as content:
+                    return _extract_metrics(content)
+            except (ValueError, OSError):
+                f.seek(0)
+        return _extract_metrics(f.read())
+
+
+def _extract_metrics(content) -> dict:
+    """Collect metrics from benchmark output in a single regex pass."""
     metrics = {}
-
-    with open(filepath, 'r') as f:
-        content = f.read()
-
-    # Extract P99 latency (µs)
-    p99_match = re.search(r'P99:\s*(\d+)', content)
-    if p99_match:
-        metrics['p99_latency'] = int(p99_match.group(1))
-
-    # Extract throughput (msg/s)
-    throughput_match = re.search(r'Throughput:\s*([\d.]+)\s*msg/s', content)
-    if throughput_match:
-        metrics['throughput'] = float(throughput_match.group(1))
-
-    # Extract P50 latency
-    p50_match = re.search(r'P50:\s*(\d+)', content)
-    if p50_match:
-        metrics['p50_latency'] = int(p50_match.group(1))
-
-    # Extract P95 latency
-    p95_match = re.search(r'P95:\s*(\d+)', content)
-    if p95_match:
-        metrics['p95_latency'] = int(p95_match.group(1))
-
+    for match in METRICS_RE.finditer(content):
+        name = match.lastgroup
+        # First occurrence of each metric wins
+        if name in metrics:
+            continue
+        raw = match.group(name)
+        metrics[name] = float(raw) if name == 'throughput' else int(raw)
     return metrics
 
 